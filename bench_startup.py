@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""
+@package bench_startup
+
+Benchmark for the fixed startup cost of the DeviantArt downloader tool. Each case is run in a
+fresh interpreter, so import and initialization costs are measured as a real invocation pays them.
+Exits with status 1 if any case imports one of HEAVY_MODULES.
+"""
+
+import sys
+import argparse
+import subprocess
+import statistics
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+# Modules which must not be imported unless DeviantArt is actually contacted
+HEAVY_MODULES = ("asyncio", "aiohttp", "aiofiles", "sanction", "mimetypes", "sqlite3", "csv",
+    "random")
+
+CASES = [
+    ("interpreter", "pass"),
+    ("import explorer", "import explorer"),
+    ("import metadata", "import metadata"),
+    ("import frontend", "import frontend"),
+    ("init frontend", "import frontend; frontend.DAFrontend()"),
+    ("parse args", "import frontend; frontend.DAFrontend().parser.parse_args(['user', '-g'])"),
+    ("da_downloader -h", "import sys, runpy; sys.argv = ['da_downloader.py', '-h']\n"
+        + "try: runpy.run_path('da_downloader.py', run_name = '__main__')\n"
+        + "except SystemExit: pass"),
+]
+
+def time_case(code, runs):
+    """
+    Time a snippet in fresh interpreters.
+    :param code: str Python code to run.
+    :param runs: int Number of interpreters to start.
+    :return list of float wall-clock durations in milliseconds.
+    """
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd = ROOT, check = True,
+            stdout = subprocess.DEVNULL)
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+def heavy_imports(code):
+    """
+    Find which heavy modules a snippet imports.
+    :param code: str Python code to run.
+    :return list of str names of heavy modules left in sys.modules.
+    """
+    probe = code + "\nimport sys; print(' '.join(m for m in {} if m in sys.modules))".format(
+        repr(HEAVY_MODULES))
+    result = subprocess.run([sys.executable, "-c", probe], cwd = ROOT, check = True,
+        stdout = subprocess.PIPE, universal_newlines = True)
+    return result.stdout.splitlines()[-1].split() if result.stdout.strip() else []
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "DeviantArt downloader startup benchmark.")
+    parser.add_argument("-n", "--runs",
+        dest = "runs",
+        type = int,
+        default = 20,
+        help = "Number of fresh interpreters to time per case."
+    )
+    args = parser.parse_args()
+
+    print(f"{'case':<20} {'median ms':>10} {'min ms':>10} {'overhead ms':>12}  heavy imports")
+    baseline = None
+    regressions = []
+    for name, code in CASES:
+        durations = time_case(code, args.runs)
+        median = statistics.median(durations)
+        if baseline is None:
+            baseline = median  # The first case is the bare interpreter
+        heavy = heavy_imports(code)
+        if heavy:
+            regressions.append(name)
+        print(f"{name:<20} {median:>10.1f} {min(durations):>10.1f} {median - baseline:>12.1f}  "
+            + (" ".join(heavy) or "none"))
+
+    if regressions:
+        print("Heavy modules imported by: " + ", ".join(regressions), file = sys.stderr)
+        sys.exit(1)
@@ -7,8 +7,7 @@ Runnable script frontend for DeviantArt downloader tool.
 """
 
 import sys
-from explorer import *
-from frontend import *
+from frontend import DAFrontend
 
 if __name__ == "__main__":
     downloader = DAFrontend()
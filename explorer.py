@@ -5,19 +5,17 @@
 
 Module for abstracting functionality from DeviantArt. Wraps the DeviantArt API and improves
 performance when fetching resources.
+
+The networking stack (sanction, aiohttp, aiofiles) is only imported once it is first used, so
+that importing this module stays cheap for commands which never contact DeviantArt.
 """
 
 import os
 from enum import Enum, auto
 import json
 from pathlib import Path
-import mimetypes
-import aiohttp
-import aiofiles
 
 from urllib.parse import urlencode
-from urllib.error import HTTPError
-from sanction import Client
 
 class DAExplorerException(Exception):
     pass
@@ -78,6 +76,15 @@ class Deviation():
         self.deviationid = ""
         self.is_downloadable = False
         self.preview_src = ""
+        self.title = ""
+        self.url = ""
+        self.author = ""
+        self.published_time = None  # UNIX timestamp
+        self.filesize = None  # Of the preview content, in bytes
+        self.width = None
+        self.height = None
+        self.favourites = None
+        self.comments = None
 
 class DAExplorer():
     """API object for searching and downloading Deviations via DeviantArt."""
@@ -98,8 +105,10 @@ class DAExplorer():
         # Define all class members
         self.oauth = None
         self.user = target_user
+        self.session = None
 
         # @todo move away from sanction oauth2 library, make this (and callers) async
+        from sanction import Client
         self.oauth = Client(
             auth_endpoint = "https://www.deviantart.com/oauth2/authorize",
             token_endpoint = "https://www.deviantart.com/oauth2/token",
@@ -107,6 +116,17 @@ class DAExplorer():
             client_id = credentials.client_id,
             client_secret = credentials.client_secret
         )
+        self._authorize()
+
+        self._check_creds()
+        self._check_user()
+
+    def _authorize(self):
+        """
+        Helper method to request a (new) access token for the API handle.
+        Raises exception if authorization fails.
+        """
+        from urllib.error import HTTPError
         try:
             self.oauth.request_token(grant_type = "client_credentials")
         except HTTPError as e:
@@ -115,26 +135,32 @@ class DAExplorer():
             else:
                 raise DAExplorerException("Error authorizing: " + str(e))
 
-        self._check_creds()
-        self._check_user()
-
     def _api(self, endpoint, get_data=dict(), post_data=dict()):
         """
         Helper method to make a DeviantArt API call.
+        If the access token has expired (long-running sessions), it is renewed and the call
+        is attempted once more.
         :param endpoint: The endpoint to make the API call to.
         :param get_data: dict - data send through GET
         :param post_data: dict - data send through POST
         """
 
         # @todo move away from sanction oauth2 library, make this (and callers) async
+        from urllib.error import HTTPError
 
         if get_data:
             request_parameter = "{}?{}".format(endpoint, urlencode(get_data))
         else:
             request_parameter = endpoint
+        encdata = urlencode(post_data, True).encode('utf-8')
         try:
-            encdata = urlencode(post_data, True).encode('utf-8')
-            response = self.oauth.request(request_parameter, data=encdata)
+            try:
+                response = self.oauth.request(request_parameter, data=encdata)
+            except HTTPError as e:
+                if e.code != 401:
+                    raise
+                self._authorize()
+                response = self.oauth.request(request_parameter, data=encdata)
         except HTTPError as e:
             response = json.loads(e.read().decode("utf-8"))
             if "error" in response:
@@ -157,6 +183,33 @@ class DAExplorer():
         """
         return self._api(f"/user/profile/{self.user}")
 
+    def set_user(self, target_user, check = True):
+        """
+        Retarget this API handle to another user, keeping the current authorization.
+        :param target_user: str for user to explore in this session.
+        :param check: bool Whether to verify that the user exists (costs one API call).
+        """
+        if not type(target_user) is str:
+            raise DAExplorerException("Argument 'target_user' must be type str.")
+        self.user = target_user
+        if check:
+            self._check_user()
+
+    async def open_session(self):
+        """
+        Open a persistent HTTP session, reused by all following downloads until closed.
+        Without an open session, each download uses its own short-lived session.
+        """
+        if self.session is None:
+            import aiohttp
+            self.session = aiohttp.ClientSession()
+
+    async def close_session(self):
+        """Close the persistent HTTP session, if one is open."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
     def _get_gallery_folders(self, page_idx):
         """
         Helper method to call DeviantArt API function "/gallery/folders".
@@ -225,6 +278,14 @@ class DAExplorer():
             "mature_content": True
         })
 
+    def _get_deviation(self, deviationid):
+        """
+        Helper method to call DeviantArt API function "/deviation/{deviationid}".
+        :param deviationid: str GUID for the Deviation to identify.
+        :return dict Response from the API.
+        """
+        return self._api(f"/deviation/{deviationid}")
+
     def _download_deviation(self, deviationid):
         """
         Helper method to call DeviantArt API function "/deviation/download/{deviationid}".
@@ -302,15 +363,58 @@ class DAExplorer():
             return None
 
         for dev_info in response["results"]:
-            output.append(Deviation())
-            dev = output[-1]
-            dev.deviationid = dev_info["deviationid"]
-            dev.is_downloadable = dev_info["is_downloadable"]
-            if "content" in dev_info:
-                dev.preview_src = dev_info["content"]["src"]
+            output.append(self._parse_deviation(dev_info))
 
         return output
 
+    def get_deviation(self, deviationid):
+        """
+        Fetch a single Deviation by its ID.
+        :param deviationid: str GUID for the Deviation to fetch.
+        :return Deviation for the ID.
+        """
+        if not type(deviationid) is str:
+            raise DAExplorerException("Argument 'deviationid' must be type str.")
+        return self._parse_deviation(self._get_deviation(deviationid))
+
+    def _parse_deviation(self, dev_info):
+        """
+        Helper method to build a Deviation from an API result.
+        :param dev_info: dict Deviation object from the API.
+        :return Deviation for the result.
+        """
+        dev = Deviation()
+        dev.deviationid = dev_info["deviationid"]
+        dev.is_downloadable = dev_info["is_downloadable"]
+        if "content" in dev_info:
+            dev.preview_src = dev_info["content"]["src"]
+        self._parse_metadata(dev, dev_info)
+        return dev
+
+    def _parse_metadata(self, deviation, dev_info):
+        """
+        Helper method to fill in the descriptive fields of a Deviation from an API result.
+        Parsing is best-effort: fields which are missing or malformed are left at their defaults,
+        since listing (and thus downloading) must not fail because of metadata alone.
+        :param deviation: Deviation object to populate.
+        :param dev_info: dict Deviation object from the API.
+        """
+        def field(parse):
+            try:
+                return parse()
+            except (KeyError, TypeError, ValueError, AttributeError):
+                return None
+
+        deviation.title = field(lambda: str(dev_info["title"])) or ""
+        deviation.url = field(lambda: str(dev_info["url"])) or ""
+        deviation.author = field(lambda: str(dev_info["author"]["username"])) or ""
+        deviation.published_time = field(lambda: int(dev_info["published_time"]))
+        deviation.filesize = field(lambda: int(dev_info["content"]["filesize"]))
+        deviation.width = field(lambda: int(dev_info["content"]["width"]))
+        deviation.height = field(lambda: int(dev_info["content"]["height"]))
+        deviation.favourites = field(lambda: int(dev_info["stats"]["favourites"]))
+        deviation.comments = field(lambda: int(dev_info["stats"]["comments"]))
+
     async def download_deviation(self, deviation, full_path):
         """
         Download the requested Deviation.
@@ -331,19 +435,35 @@ class DAExplorer():
                 # Deviation has no image content to be downloaded
                 return
             os.makedirs(Path(full_path), exist_ok = True)  # Ensure the output path exists
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url_targ) as resp:
-                    if resp.status == 200:  # HTTP success
-                        extension = mimetypes.guess_extension(resp.content_type, strict = False)
-                        if not extension:
-                            # Do it the hackish way if mimetypes can't figure it out
-                            extension = "." + url_targ.split("/")[-1].split(".")[1].split("?")[0]
-                        f = await aiofiles.open(
-                            Path(full_path).joinpath(str(deviation.deviationid) + extension),
-                            mode='wb'
-                        )
-                        await f.write(await resp.read())
-                        await f.close()
+            if self.session is not None:
+                await self._fetch_to_file(self.session, deviation, url_targ, full_path)
+            else:
+                import aiohttp
+                async with aiohttp.ClientSession() as session:
+                    await self._fetch_to_file(session, deviation, url_targ, full_path)
         except Exception as e:
             raise DAExplorerException("Error downloading deviation " + str(deviation.deviationid)
                 + ": " + str(e))
+
+    async def _fetch_to_file(self, session, deviation, url_targ, full_path):
+        """
+        Helper method to fetch Deviation content from a URL and write it to disk.
+        :param session: aiohttp.ClientSession to fetch with.
+        :param deviation: Deviation object being downloaded.
+        :param url_targ: str URL of the content to fetch.
+        :param full_path: path-like object (excluding file name) in which to store result.
+        """
+        import mimetypes
+        import aiofiles
+        async with session.get(url_targ) as resp:
+            if resp.status == 200:  # HTTP success
+                extension = mimetypes.guess_extension(resp.content_type, strict = False)
+                if not extension:
+                    # Do it the hackish way if mimetypes can't figure it out
+                    extension = "." + url_targ.split("/")[-1].split(".")[1].split("?")[0]
+                f = await aiofiles.open(
+                    Path(full_path).joinpath(str(deviation.deviationid) + extension),
+                    mode='wb'
+                )
+                await f.write(await resp.read())
+                await f.close()
@@ -4,15 +4,38 @@
 @package frontend
 
 Module for representing functionality exposed in the downloader logic.
+
+Modules only needed by some commands (asyncio, random, date parsing, and the networking stack
+imported by the explorer) are imported where they are used, keeping startup cheap for short
+invocations.
 """
 
 import sys
 from explorer import *
+from metadata import *
 import argparse
 import pathlib
-import asyncio as aio
+import time
+
+class WatchTarget():
+    """Class representing one user (and their folders) polled in watch mode."""
+    def __init__(self):
+        self.user = ""
+        self.interval = 0.0
+        self.flag_gal_all = False
+        self.down_gal = None
+        self.down_col = None
+        self.folders = None  # Resolved list of (Source, Folder) pairs, reused between polls
+        self.folders_time = 0.0
+        self.next_poll = 0.0
+        self.rebuild = False  # Ignore cached folders on the next poll ('-f', first poll only)
 
 class DAFrontend():
+    DEFAULT_WATCH_INTERVAL = 600.0  # Seconds between polls of one target
+    DEFAULT_WATCH_JITTER = 0.1  # Fraction of the interval to randomly vary each poll by
+    DEFAULT_FOLDER_REFRESH = 3600.0  # Seconds between re-enumerations of a target's folders
+    MAX_DOWNLOAD_ATTEMPTS = 3  # Downloads of one Deviation before it is no longer retried
+
     def __init__(self):
         # Define class members
         self.parser = argparse.ArgumentParser(description = "DeviantArt downloader.")
@@ -22,19 +45,31 @@ class DAFrontend():
         self.error_stream = sys.stdout
         self.creds = None
         self.user = None
+        self.out_root = None
         self.out_dir = None
         self.flag_list = False
         self.flag_rebuild = False
         self.flag_gal_all = False
         self.down_gal = None
         self.down_col = None
+        self.metadata_path = None
+        self.store = None
+        self.export_format = None
+        self.export_file = None
+        self.export_filters = None
+        self.watch_targets = None
+        self.watch_jitter = DAFrontend.DEFAULT_WATCH_JITTER
+        self.folder_refresh = DAFrontend.DEFAULT_FOLDER_REFRESH
 
     def _build_parser(self):
         """Helper method: generate parser commands."""
 
         self.parser.add_argument("user",
             type = str,
-            help = "DeviantArt username to explore.",
+            nargs = "?",
+            help = """
+                DeviantArt username to explore. Required unless '--watch' or '--export' is used.
+                """,
         )
         self.parser.add_argument("-a", "--auth_creds",
             dest = "creds",
@@ -104,6 +139,64 @@ class DAFrontend():
                 '--force-rebuild' option.
             """
         )
+        self.parser.add_argument("-w", "--watch",
+            dest = "watch_config",
+            type = str,
+            default = None,
+            help = """
+                Run as a daemon, polling the users and folders listed in the given JSON watch
+                configuration file and downloading new Deviations as they appear. Only the
+                first pages of each folder are fetched until already-downloaded Deviations are
+                reached. The 'user', '-l', '-g', '--gallery-all' and '-c' options are ignored.
+                With '-f', caches are only ignored on the first poll of each target.
+                """
+        )
+
+        self.parser.add_argument("-m", "--metadata-db",
+            dest = "metadata_db",
+            type = str,
+            default = None,
+            help = """
+                SQLite file in which the metadata of every listed Deviation (title, author,
+                publication time, folders, size, dimensions and stats) is recorded. Defaults to
+                'metadata.sqlite3' in the output directory.
+                """
+        )
+        self.parser.add_argument("-x", "--export",
+            dest = "export_format",
+            type = str,
+            choices = DAMetadataStore.EXPORT_FORMATS,
+            default = None,
+            help = """
+                Export recorded metadata instead of contacting DeviantArt. If 'user' is given,
+                only Deviations found in that user's folders are exported. All other commands
+                are ignored.
+                """
+        )
+        self.parser.add_argument("--export-output",
+            dest = "export_file",
+            type = str,
+            default = None,
+            help = "File to write the export to. Default behavior is to print to command line."
+        )
+        self.parser.add_argument("--export-folder",
+            dest = "export_folder",
+            type = str,
+            default = None,
+            help = "Only export Deviations found in folders of this name."
+        )
+        self.parser.add_argument("--export-author",
+            dest = "export_author",
+            type = str,
+            default = None,
+            help = "Only export Deviations by this author."
+        )
+        self.parser.add_argument("--export-since",
+            dest = "export_since",
+            type = str,
+            default = None,
+            help = "Only export Deviations published on or after this date (YYYY-MM-DD, UTC)."
+        )
 
     def _populate_args(self, raw_args):
         """
@@ -111,11 +204,37 @@ class DAFrontend():
         :param raw_args: str Arguments for this application.
         """
         args = self.parser.parse_args(raw_args)
+        if args.user is None and args.watch_config is None and args.export_format is None:
+            self.parser.error("user is required unless --watch or --export is used")
+        since = None
+        if args.export_since:
+            import calendar
+            from datetime import datetime
+            try:
+                since = calendar.timegm(datetime.strptime(args.export_since, "%Y-%m-%d")
+                    .timetuple())
+            except ValueError:
+                self.parser.error("argument --export-since: expected date as YYYY-MM-DD")
 
         # Error redirection first, since it affects all options following
         if args.error_file:
             self.error_stream = open(args.error_file, "w+")
 
+        # Metadata arguments
+        self.metadata_path = pathlib.Path(args.metadata_db) if args.metadata_db \
+            else pathlib.Path(args.out_dir).joinpath("metadata.sqlite3")
+        if args.export_format:
+            # Exports only read the metadata store; skip everything API-related
+            self.export_format = args.export_format
+            self.export_file = args.export_file
+            self.export_filters = {
+                "user": args.user,
+                "folder_name": args.export_folder,
+                "author": args.export_author,
+                "since": since
+            }
+            return
+
         # API arguments
         try:
             self.creds = Credentials().from_file(args.creds)
@@ -125,9 +244,20 @@ class DAFrontend():
             sys.exit()
         self.user = args.user
 
+        # Watch configuration
+        if args.watch_config:
+            try:
+                self._load_watch_config(args.watch_config)
+            except Exception as e:
+                print("Error loading watch configuration: " + str(type(e)) + ": " + str(e),
+                    file = self.error_stream)
+                sys.exit()
+            self.user = self.watch_targets[0].user
+
         # Output directory selection
-        self.out_dir = pathlib.Path(args.out_dir).joinpath(self.user)
-        os.makedirs(self.out_dir, exist_ok = True)
+        # @note directories are only created once something is written into them
+        self.out_root = pathlib.Path(args.out_dir)
+        self.out_dir = self.out_root.joinpath(self.user)
 
         # Flag commands
         self.flag_list = args.do_list
@@ -138,6 +268,42 @@ class DAFrontend():
         self.down_gal = args.galleries
         self.down_col = args.collections
 
+    def _load_watch_config(self, full_path):
+        """
+        Helper method: populate the watch targets from a JSON watch configuration file.
+        :param full_path: A path-like object to the watch configuration file.
+        """
+        with open(full_path) as file:
+            config = json.load(file)
+        if not type(config) is dict or not type(config.get("targets")) is list \
+                or len(config["targets"]) == 0:
+            raise Exception("Watch configuration must be a JSON object with a non-empty "
+                + "list 'targets'.")
+
+        interval = float(config.get("interval", DAFrontend.DEFAULT_WATCH_INTERVAL))
+        self.watch_jitter = float(config.get("jitter", DAFrontend.DEFAULT_WATCH_JITTER))
+        self.folder_refresh = float(config.get("folder_refresh",
+            DAFrontend.DEFAULT_FOLDER_REFRESH))
+        if interval <= 0 or not 0 <= self.watch_jitter < 1:
+            raise Exception("Watch 'interval' must be positive and 'jitter' within [0, 1).")
+
+        self.watch_targets = []
+        for target_info in config["targets"]:
+            if not type(target_info) is dict or not type(target_info.get("user")) is str:
+                raise Exception("Each watch target must be a JSON object with string 'user'.")
+            for key in ("galleries", "collections"):
+                if not target_info.get(key) is None and not type(target_info[key]) is list:
+                    raise Exception(f"Watch target '{key}' must be a list of folder names.")
+            target = WatchTarget()
+            target.user = target_info["user"]
+            target.interval = float(target_info.get("interval", interval))
+            if target.interval <= 0:
+                raise Exception("Watch target 'interval' must be positive.")
+            target.flag_gal_all = bool(target_info.get("gallery_all", False))
+            target.down_gal = target_info.get("galleries")
+            target.down_col = target_info.get("collections")
+            self.watch_targets.append(target)
+
     def _build_folder_list(self, source):
         """
         Helper method: construct list of folders available for the given source.
@@ -192,25 +358,30 @@ class DAFrontend():
         Helper method: error-handled API download of one Deviation.
         :param deviation: Deviation to download.
         :param out_dir: path-like to the directory where output should be placed.
+        :return bool Whether the download succeeded.
         """
         try:
             await self.api.download_deviation(deviation, out_dir)
         except Exception as e:
             print("Failed to download deviation " + deviation.deviationid + ": "
                 + str(type(e)) + ": " + str(e), file = self.error_stream)
+            return False
+        return True
 
     async def _download_group(self, deviations, out_dir):
         """
         Helper method: batch download a group of Deviations asynchronously (better performance).
         :param deviations: list of Deviations to download.
         :param out_dir: path-like to the directory where output should be placed.
+        :return list of bool, whether each Deviation (in order) was downloaded successfully.
         """
+        import asyncio as aio
         tasks = []
         for deviation in deviations:
             tasks.append(aio.create_task(
                 self._download_with_error(deviation, out_dir)
             ))
-        await aio.gather(*tasks)
+        return await aio.gather(*tasks)
 
     def _download_folder(self, source, folder):
         """
@@ -219,6 +390,8 @@ class DAFrontend():
         :param source: Source for the folder to download.
         :param folder: Folder to download.
         """
+        import asyncio as aio
+
         # Identify the output directory for this folder download
         local_out_dir = None
         if source == Source.GALLERY and folder == None:
@@ -238,9 +411,17 @@ class DAFrontend():
             with open(local_out_dir.joinpath("cache"), "r") as cache:
                 last_cached = cache.read()
 
+        # Get the Deviations which failed to download previously, with their attempt counts
+        retries = {}
+        retry_path = local_out_dir.joinpath("retry")
+        if os.path.exists(retry_path):
+            with open(retry_path, "r") as retry:
+                retries = json.load(retry)
+
         # Do the folder download
         idx = 0
         first_fetched_deviationid = None
+        attempted = set()
         while True:
             # Multiple attempts for fetching the Deviation list for this page
             retry_count = 0
@@ -265,6 +446,14 @@ class DAFrontend():
             if devs == None:
                 break
 
+            # Record metadata for everything listed, cached or not
+            if self.store != None:
+                try:
+                    self.store.record_deviations(self.user, source, folder, devs)
+                except Exception as e:
+                    print("Failed to record metadata: " + str(type(e)) + ": " + str(e),
+                        file = self.error_stream)
+
             # For caching
             if idx == 0:
                 first_fetched_deviationid = devs[0].deviationid
@@ -278,26 +467,71 @@ class DAFrontend():
                         hit_cache_end = True
 
             # Download this group of deviations
-            aio.get_event_loop().run_until_complete(self._download_group(devs, local_out_dir))
+            results = aio.get_event_loop().run_until_complete(
+                self._download_group(devs, local_out_dir))
+            for dev, success in zip(devs, results):
+                self._count_attempt(retries, dev.deviationid, success)
+                attempted.add(dev.deviationid)
             print(".", end="", flush=True)
             idx += 1
 
             if hit_cache_end:
                 break;
 
-        # Generate the new cache
-        with open(local_out_dir.joinpath("cache"), "w") as cache:
-            cache.write(first_fetched_deviationid)
-        print("Done.")
+        # Retry Deviations which failed previously (and weren't just listed again)
+        to_retry = [deviationid for deviationid in retries if not deviationid in attempted]
+        if len(to_retry) > 0:
+            devs = []
+            for deviationid in to_retry:
+                try:
+                    devs.append(self.api.get_deviation(deviationid))
+                except Exception as e:
+                    print("Failed to fetch deviation " + deviationid + ": " + str(type(e))
+                        + ": " + str(e), file = self.error_stream)
+                    self._count_attempt(retries, deviationid, False)
+            results = aio.get_event_loop().run_until_complete(
+                self._download_group(devs, local_out_dir))
+            for dev, success in zip(devs, results):
+                self._count_attempt(retries, dev.deviationid, success)
+
+        # Generate the new cache (empty folders have nothing to cache)
+        if first_fetched_deviationid != None or len(retries) > 0:
+            os.makedirs(local_out_dir, exist_ok = True)
+        if first_fetched_deviationid != None:
+            with open(local_out_dir.joinpath("cache"), "w") as cache:
+                cache.write(first_fetched_deviationid)
+        if len(retries) > 0:
+            with open(retry_path, "w") as retry:
+                json.dump(retries, retry, indent = "  ")
+        elif os.path.exists(retry_path):
+            os.remove(retry_path)
+        print("Done." if len(retries) == 0 else f"Done ({len(retries)} to retry).")
+
+    def _count_attempt(self, retries, deviationid, success):
+        """
+        Helper method: update the retry record of a folder after one download attempt.
+        Deviations are dropped once downloaded, or after MAX_DOWNLOAD_ATTEMPTS failed attempts.
+        :param retries: dict of str Deviation ID to int failed attempts so far; updated in place.
+        :param deviationid: str ID of the Deviation attempted.
+        :param success: bool Whether the attempt succeeded.
+        """
+        if success:
+            retries.pop(deviationid, None)
+            return
+        retries[deviationid] = retries.get(deviationid, 0) + 1
+        if retries[deviationid] >= DAFrontend.MAX_DOWNLOAD_ATTEMPTS:
+            print("Giving up on deviation " + deviationid + " after "
+                + str(retries[deviationid]) + " failed attempts.", file = self.error_stream)
+            del retries[deviationid]
 
-    def _download_folders(self, source, folder_names):
+    def _select_folders(self, source, folder_names):
         """
-        Helper method to download multiple folders' worth of Deviations.
-        If folder_names is empty, download all folders.
-        :param source: Source for the folders to download.
-        :param folder_names: list of str identifying the folders in the source to download.
+        Helper method to select the Folders of a source matching the requested names.
+        If folder_names is empty, select all folders.
+        :param source: Source for the folders to select.
+        :param folder_names: list of str identifying the folders in the source to select.
+        :return set of selected Folders.
         """
-        # Generate list of folders to target
         available_folders = set(self._build_folder_list(source))
         folders_to_download = set()
         if len(folder_names) == 0:
@@ -309,19 +543,126 @@ class DAFrontend():
             for folder in available_folders:
                 if folder.name in desired_folders:
                     folders_to_download.add(folder)
+        return folders_to_download
 
+    def _download_folders(self, source, folder_names):
+        """
+        Helper method to download multiple folders' worth of Deviations.
+        If folder_names is empty, download all folders.
+        :param source: Source for the folders to download.
+        :param folder_names: list of str identifying the folders in the source to download.
+        """
         # Do the downloads
-        for folder in folders_to_download:
+        for folder in self._select_folders(source, folder_names):
             self._download_folder(source, folder)
 
+    def _jittered(self, interval):
+        """
+        Helper method: randomly vary a polling interval, to avoid polling targets in lockstep.
+        :param interval: float Nominal interval in seconds.
+        :return float Interval in seconds with jitter applied.
+        """
+        import random
+        return interval * (1 + random.uniform(-self.watch_jitter, self.watch_jitter))
+
+    def _poll_target(self, target):
+        """
+        Helper method: download new Deviations for one watch target.
+        :param target: WatchTarget to poll.
+        """
+        self.api.set_user(target.user, check = False)
+        self.user = target.user
+        self.out_dir = self.out_root.joinpath(target.user)
+
+        # Folder enumeration is comparatively expensive, so only refresh it occasionally
+        now = time.monotonic()
+        if target.folders is None or now - target.folders_time >= self.folder_refresh:
+            folders = []
+            if target.flag_gal_all:
+                folders.append((Source.GALLERY, None))
+            if target.down_gal != None:
+                folders += [(Source.GALLERY, folder)
+                    for folder in self._select_folders(Source.GALLERY, target.down_gal)]
+            if target.down_col != None:
+                folders += [(Source.COLLECTION, folder)
+                    for folder in self._select_folders(Source.COLLECTION, target.down_col)]
+            target.folders = folders
+            target.folders_time = now
+
+        self.flag_rebuild = target.rebuild
+        for source, folder in target.folders:
+            self._download_folder(source, folder)
+        target.rebuild = False
+
+    def _watch(self):
+        """Helper method: poll all watch targets on their intervals until interrupted."""
+        # Validate every target up front; polls afterwards skip the per-user check
+        for target in self.watch_targets:
+            self.api.set_user(target.user)
+            target.rebuild = self.flag_rebuild
+
+        # Stagger the first polls so targets don't all hit the API at once
+        import random
+        start = time.monotonic()
+        for target in self.watch_targets:
+            target.next_poll = start + random.uniform(0, self.watch_jitter * target.interval)
+
+        import asyncio as aio
+        loop = aio.get_event_loop()
+        loop.run_until_complete(self.api.open_session())
+        try:
+            while True:
+                target = min(self.watch_targets, key = lambda t: t.next_poll)
+                delay = target.next_poll - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                try:
+                    self._poll_target(target)
+                except Exception as e:
+                    # Keep watching; the next poll of this target may succeed
+                    print(f"Failed to poll user '{target.user}': " + str(type(e)) + ": "
+                        + str(e), file = self.error_stream)
+                    self.error_stream.flush()
+                target.next_poll = time.monotonic() + self._jittered(target.interval)
+        except KeyboardInterrupt:
+            print("Watch stopped.")
+        finally:
+            loop.run_until_complete(self.api.close_session())
+
+    def _export_metadata(self):
+        """Helper method: export recorded metadata in the requested format."""
+        if not self.metadata_path.exists():
+            print("No metadata recorded at " + str(self.metadata_path.absolute()) + ".",
+                file = self.error_stream)
+            return
+        self.store = DAMetadataStore(self.metadata_path)
+        if self.export_file:
+            with open(self.export_file, "w", newline = "", encoding = "utf-8") as stream:
+                count = self.store.export(self.export_format, stream, **self.export_filters)
+            print(f"Exported {count} deviations to {self.export_file}.")
+        else:
+            self.store.export(self.export_format, sys.stdout, **self.export_filters)
+
     def _safe_close(self):
         """Helper method: ensure all open resource handles are closed before exit."""
+        if self.store != None:
+            self.store.close()
         if self.error_stream != sys.stdout:
             self.error_stream.close()
 
     def run(self, args):
         self._populate_args(args)
 
+        if self.export_format:
+            try:
+                self._export_metadata()
+            except Exception as e:
+                print("Error exporting metadata: " + str(type(e)) + ": " + str(e),
+                    file = self.error_stream)
+            finally:
+                self._safe_close()
+            return
+
         try:
             # Open the API for use
             try:
@@ -333,8 +674,16 @@ class DAFrontend():
                 print("Failed to open API: " + str(e))
                 return
 
+            # Prepare the metadata store, which records everything listed while downloading
+            # @note the store (and its directory) is only created once something is recorded
+            if not self.flag_list or self.watch_targets:
+                self.store = DAMetadataStore(self.metadata_path)
+
             # Application functions
-            if self.flag_list:
+            if self.watch_targets:
+                # Ignore other commands; poll the configured targets until interrupted
+                self._watch()
+            elif self.flag_list:
                 # Ignore other commands; only list available folders
                 self._list_folders()
             else:
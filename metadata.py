@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""
+@package metadata
+
+Module for keeping a local, queryable index of Deviation metadata. Deviations are recorded as
+they are listed through the API, so questions about a mirror can be answered (and exported)
+without calling the API again.
+
+sqlite3 and csv are only imported once a store is first used, to keep CLI startup cheap.
+"""
+
+import os
+import json
+from pathlib import Path
+
+from explorer import Source
+
+class DAMetadataException(Exception):
+    pass
+
+class DAMetadataStore():
+    """SQLite-backed store of Deviation metadata and folder membership."""
+
+    EXPORT_FORMATS = ("jsonl", "csv")
+    EXPORT_FIELDS = ("deviationid", "title", "author", "published_time", "url",
+        "is_downloadable", "src", "filesize", "width", "height", "favourites", "comments",
+        "folders")
+
+    # Columns of the 'deviations' table, in the order they are written and read
+    _DEVIATION_COLUMNS = ("deviationid", "title", "author", "published_time", "url",
+        "is_downloadable", "src", "filesize", "width", "height", "favourites", "comments")
+
+    GALLERY_ALL_FOLDERID = "all"
+    GALLERY_ALL_NAME = "All"
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS deviations (
+            deviationid TEXT PRIMARY KEY,
+            title TEXT,
+            author TEXT,
+            published_time INTEGER,
+            url TEXT,
+            is_downloadable INTEGER NOT NULL,
+            src TEXT,
+            filesize INTEGER,
+            width INTEGER,
+            height INTEGER,
+            favourites INTEGER,
+            comments INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS memberships (
+            deviationid TEXT NOT NULL REFERENCES deviations(deviationid),
+            user TEXT NOT NULL,
+            source TEXT NOT NULL,
+            folderid TEXT NOT NULL,
+            folder_name TEXT NOT NULL,
+            PRIMARY KEY (deviationid, user, source, folderid)
+        );
+        CREATE INDEX IF NOT EXISTS deviations_author ON deviations(author);
+        CREATE INDEX IF NOT EXISTS deviations_published_time ON deviations(published_time);
+        CREATE INDEX IF NOT EXISTS memberships_folder
+            ON memberships(user, source, folder_name);
+        CREATE INDEX IF NOT EXISTS memberships_folder_name ON memberships(folder_name, user);
+    """
+
+    def __init__(self, full_path):
+        """
+        Prepare the metadata store. The database (and its directory) is only opened, and
+        created if necessary, once it is first used.
+        :param full_path: A path-like object to the SQLite database file.
+        """
+        self.full_path = Path(full_path)
+        self.db = None
+
+    def _open(self):
+        """Helper method to open (creating if necessary) the database, if not yet open."""
+        if self.db != None:
+            return
+        import sqlite3
+        try:
+            os.makedirs(self.full_path.parent, exist_ok = True)
+            self.db = sqlite3.connect(str(self.full_path))
+            self.db.executescript(DAMetadataStore._SCHEMA)
+        except (OSError, sqlite3.Error) as e:
+            self.db = None
+            raise DAMetadataException("Error opening metadata store: " + str(e))
+
+    def close(self):
+        """Close the metadata store, if it was opened."""
+        if self.db != None:
+            self.db.close()
+            self.db = None
+
+    def record_deviations(self, user, source, folder, deviations):
+        """
+        Record (or update) metadata for Deviations listed in one Folder.
+        :param user: str User whose Folder was listed.
+        :param source: Source of the Folder.
+        :param folder: Folder the Deviations were listed in, or None for 'gallery/all'.
+        :param deviations: list of Deviations to record.
+        """
+        if not type(source) is Source:
+            raise DAMetadataException("Argument 'source' must be type Source.")
+        if folder is None:
+            folderid = DAMetadataStore.GALLERY_ALL_FOLDERID
+            folder_name = DAMetadataStore.GALLERY_ALL_NAME
+        else:
+            folderid = folder.folderid
+            folder_name = folder.name
+
+        insert_deviations = "INSERT OR REPLACE INTO deviations ({}) VALUES ({})".format(
+            ", ".join(DAMetadataStore._DEVIATION_COLUMNS),
+            ", ".join("?" * len(DAMetadataStore._DEVIATION_COLUMNS)))
+
+        self._open()
+        with self.db:  # Single transaction per page
+            self.db.executemany(insert_deviations,
+                [(dev.deviationid, dev.title, dev.author, dev.published_time, dev.url,
+                    int(dev.is_downloadable), dev.preview_src, dev.filesize, dev.width,
+                    dev.height, dev.favourites, dev.comments) for dev in deviations])
+            self.db.executemany("""
+                INSERT OR REPLACE INTO memberships
+                    (deviationid, user, source, folderid, folder_name) VALUES (?, ?, ?, ?, ?)
+                """, [(dev.deviationid, user, source.name.lower(), folderid, folder_name)
+                    for dev in deviations])
+
+    def query(self, user = None, folder_name = None, author = None, since = None):
+        """
+        Query recorded Deviations, newest first. All filters are optional.
+        :param user: str Only Deviations found in this user's folders.
+        :param folder_name: str Only Deviations found in folders of this name.
+        :param author: str Only Deviations by this author.
+        :param since: int Only Deviations published at or after this UNIX timestamp.
+        :return Iterator of dicts keyed by EXPORT_FIELDS. 'folders' lists every folder the
+            Deviation was found in, as "user/source/folder" separated by ';'.
+        """
+        self._open()
+        conditions = []
+        params = []
+        if user != None or folder_name != None:
+            member_conditions = []
+            if user != None:
+                member_conditions.append("user = ?")
+                params.append(user)
+            if folder_name != None:
+                member_conditions.append("folder_name = ?")
+                params.append(folder_name)
+            conditions.append("d.deviationid IN (SELECT deviationid FROM memberships WHERE "
+                + " AND ".join(member_conditions) + ")")
+        if author != None:
+            conditions.append("d.author = ?")
+            params.append(author)
+        if since != None:
+            conditions.append("d.published_time >= ?")
+            params.append(since)
+
+        cursor = self.db.execute("""
+            SELECT {},
+                group_concat(m.user || '/' || m.source || '/' || m.folder_name, ';') AS folders
+            FROM deviations d JOIN memberships m ON m.deviationid = d.deviationid
+            {}
+            GROUP BY d.deviationid
+            ORDER BY d.published_time DESC
+            """.format(", ".join("d." + column for column in DAMetadataStore._DEVIATION_COLUMNS),
+                "WHERE " + " AND ".join(conditions) if conditions else ""), params)
+        columns = [description[0] for description in cursor.description]
+        for row in cursor:
+            output = dict(zip(columns, row))
+            output["is_downloadable"] = bool(output["is_downloadable"])
+            yield output
+
+    def export(self, export_format, stream, **filters):
+        """
+        Write recorded Deviations to a stream.
+        :param export_format: str One of EXPORT_FORMATS.
+        :param stream: Text stream to write to.
+        :param filters: Filters as accepted by query().
+        :return int Number of Deviations written.
+        """
+        if not export_format in DAMetadataStore.EXPORT_FORMATS:
+            raise DAMetadataException("Argument 'export_format' must be one of: "
+                + ", ".join(DAMetadataStore.EXPORT_FORMATS) + ".")
+
+        count = 0
+        if export_format == "csv":
+            import csv
+            writer = csv.DictWriter(stream, fieldnames = DAMetadataStore.EXPORT_FIELDS)
+            writer.writeheader()
+            for row in self.query(**filters):
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in self.query(**filters):
+                stream.write(json.dumps(row) + "\n")
+                count += 1
+        return count